@@ -0,0 +1,53 @@
+"""
+On-disk cache for OpenAI responses
+Stores response text keyed by a SHA256 hash of the full request
+"""
+
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from common import write_atomic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".cache/llm"
+DEFAULT_TTL = 30 * 24 * 60 * 60  # 30 days, in seconds
+
+class DiskCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+
+    def _path(self, request):
+        """Return the cache file for a request
+
+        The key covers everything sent to the API (model, messages or input,
+        tools, temperature, ...) so any change to the prompt is a miss.
+        """
+        key = hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, request):
+        """Return the cached response text for a request, or None on a miss"""
+        path = self._path(request)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)["text"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def set(self, request, text):
+        """Store the response text for a request
+
+        Best effort, like get(): a response that was already paid for must
+        not be lost because the cache cannot be written.
+        """
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            write_atomic(self._path(request), json.dumps({"text": text}))
+        except OSError as e:
+            logger.warning("Could not write to response cache: %s", e)
@@ -0,0 +1,46 @@
+"""
+Helpers shared by the deep research scripts
+"""
+
+import os
+import sys
+import logging
+from pathlib import Path
+
+# Characters that are not allowed in filenames on common filesystems
+_UNSAFE_FILENAME_CHARS = str.maketrans('', '', '<>:"/\\|?*')
+
+def sanitize_filename(topic):
+    """Convert topic to a safe filename that matches wiki links exactly"""
+    # Only remove truly problematic characters for filesystems
+    # Keep spaces, underscores, and most special characters as they appear in wiki links
+    safe_name = topic.translate(_UNSAFE_FILENAME_CHARS)
+    safe_name = safe_name[:100]  # Limit length
+    return safe_name + '.md'
+
+def write_atomic(path, text):
+    """Write text to a file atomically
+
+    The text goes to a temporary file that is fsynced and then renamed over
+    the target, so a crash never leaves a truncated or half-written file.
+    """
+    path = Path(path)
+    # Per-process temporary name so concurrent writers never share it
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8', buffering=64 * 1024) as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def configure_logging():
+    """Log to stdout at the level named by PYTHONLOGLEVEL (default INFO)"""
+    level = os.getenv('PYTHONLOGLEVEL', 'INFO').upper()
+    logging.basicConfig(
+        level=getattr(logging, level, logging.INFO),
+        format="%(levelname)s: %(message)s",
+        stream=sys.stdout
+    )
+    # Keep the HTTP clients' per-request INFO lines out of the output
+    for name in ('httpx', 'httpcore', 'openai'):
+        logging.getLogger(name).setLevel(logging.WARNING)
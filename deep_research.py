@@ -6,18 +6,108 @@ Uses OpenAI's o4-mini-deep-research model to create comprehensive research notes
 
 import os
 import sys
+import logging
 import re
+import json
+import asyncio
+import time
+import httpx
+from bisect import bisect_left
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, RateLimitError
+import research_queue
+from cache import DiskCache
+from common import configure_logging, sanitize_filename, write_atomic
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Streamed research text needed before analysis starts early. The early
+# analysis is cut at the first paragraph break past this point.
+PARTIAL_RESEARCH_CHARS = 500
+
+# Matches a wiki link and captures its target
+_WIKI_LINK_RE = re.compile(r'\[\[([^\]]+)\]\]')
+
+# Content shorter than this is not worth an analysis call
+MIN_ANALYSIS_CHARS = 300
+
+def should_analyze(content):
+    """Whether content is long enough to be worth an analysis call"""
+    return len(content.strip()) >= MIN_ANALYSIS_CHARS
+
+def partial_research_cut(text):
+    """Where early analysis of streamed research text stops, or -1 if not yet
+
+    The cut is the first paragraph break past PARTIAL_RESEARCH_CHARS, so no
+    concept is split between the early analysis and the tail.
+    """
+    return text.find('\n\n', PARTIAL_RESEARCH_CHARS)
+
+def _list_note_stems(dir_path):
+    """List note titles (filenames without .md) in a directory"""
+    # DirEntry.is_file() uses the file type from the directory listing, so
+    # this needs no stat() per entry (except for symlinks)
+    with os.scandir(dir_path) as entries:
+        return [entry.name[:-3] for entry in entries
+                if entry.name.endswith('.md') and entry.name != "Simple_Note_Template.md" and entry.is_file()]
+
+class RateLimiter:
+    """Token-bucket throttle on requests and tokens per minute"""
+
+    def __init__(self, max_requests_per_minute, max_tokens_per_minute):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.available_request_capacity = max_requests_per_minute
+        self.available_token_capacity = max_tokens_per_minute
+        self.last_update_time = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        """Wait until there is capacity for one request consuming `tokens`"""
+        # A single request can never need more than a full minute's budget
+        tokens = min(tokens, self.max_tokens_per_minute)
+        async with self._lock:
+            while True:
+                # Refill both buckets in proportion to the time elapsed
+                now = time.monotonic()
+                elapsed = now - self.last_update_time
+                self.available_request_capacity = min(
+                    self.available_request_capacity + self.max_requests_per_minute * elapsed / 60.0,
+                    self.max_requests_per_minute,
+                )
+                self.available_token_capacity = min(
+                    self.available_token_capacity + self.max_tokens_per_minute * elapsed / 60.0,
+                    self.max_tokens_per_minute,
+                )
+                self.last_update_time = now
+                
+                if self.available_request_capacity >= 1 and self.available_token_capacity >= tokens:
+                    self.available_request_capacity -= 1
+                    self.available_token_capacity -= tokens
+                    return
+                
+                await asyncio.sleep(0.1)
+
 class DeepResearch:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    def __init__(self, rate_limiter=None, cache=None, max_attempts=5):
+        self.rate_limiter = rate_limiter
+        self.max_attempts = max_attempts
+        self.cache = cache
+        # One pooled HTTP/2 connection shared by every API call, so the TCP
+        # and TLS handshakes are paid once rather than per request. Deep
+        # research streams can be slow, hence the generous read timeout.
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            timeout=httpx.Timeout(600.0, connect=10.0)
+        )
+        self.client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=self._http)
         self.path_to_save = os.getenv('PATH_TO_SAVE')
         if not self.path_to_save:
             raise ValueError("PATH_TO_SAVE not set in .env file")
@@ -32,14 +122,33 @@ class DeepResearch:
         
         with open(self.template_path, 'r') as f:
             self.template = f.read()
+        
+        # Note titles in PATH_TO_SAVE, rebuilt when the directory changes
+        self._existing_files_cache = None
+        self._existing_files_mtime = 0
 
-    def sanitize_filename(self, topic):
-        """Convert topic to a safe filename that matches wiki links exactly"""
-        # Only remove truly problematic characters for filesystems
-        # Keep spaces, underscores, and most special characters as they appear in wiki links
-        safe_name = re.sub(r'[<>:"/\\|?*]', '', topic)
-        safe_name = safe_name[:100]  # Limit length
-        return safe_name + '.md'
+    async def aclose(self):
+        """Close the HTTP connection pool"""
+        await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    def _get_existing_files(self):
+        """Return the set of existing note titles (filenames without .md)
+
+        The listing is cached and only rescanned when the directory's
+        modification time changes; notes created by this instance are added
+        to it directly. Callers must not modify the returned set.
+        """
+        mtime = os.stat(self.path_to_save).st_mtime_ns
+        if self._existing_files_cache is None or mtime != self._existing_files_mtime:
+            self._existing_files_cache = set(_list_note_stems(self.path_to_save))
+            self._existing_files_mtime = mtime
+        return self._existing_files_cache
 
     def _messages_to_responses_input(self, messages):
         """Convert messages to the format expected by the Responses API"""
@@ -63,8 +172,65 @@ class DeepResearch:
             })
         return structured
 
-    def research_topic(self, topic):
-        """Use OpenAI to research the topic"""
+    async def _throttle(self, prompt, max_tokens=0):
+        """Wait for rate limiter capacity before sending a request"""
+        if self.rate_limiter is None:
+            return
+        # Rough estimate of ~4 characters per token, plus the completion budget
+        await self.rate_limiter.acquire(len(prompt) // 4 + max_tokens)
+
+    async def _with_backoff(self, model, call):
+        """Await `call()`, retrying with exponential backoff when rate limited
+
+        This is the only retry loop for rate limits. RateLimitError is raised
+        once max_attempts is exhausted, so the topic fails and stays queued.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await call()
+            except RateLimitError:
+                if attempt == self.max_attempts:
+                    raise
+                delay = 2 ** attempt
+                logger.warning("Rate limited on %s (attempt %d of %d), retrying in %ds",
+                               model, attempt, self.max_attempts, delay)
+                await asyncio.sleep(delay)
+
+    async def _chat(self, request):
+        """Send a chat completion request and return the response text
+
+        Responses are served from and stored in the cache when one is set.
+        Rate limited requests are retried by _with_backoff.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(request)
+            if cached is not None:
+                return cached
+        
+        async def create():
+            await self._throttle(request["messages"][-1]["content"], max_tokens=request["max_tokens"])
+            return await self.client.chat.completions.create(**request)
+        
+        response = await self._with_backoff(request["model"], create)
+        choice = response.choices[0]
+        text = (choice.message.content or "").strip()
+        
+        # A reply cut off by max_tokens is used once but never cached, so a
+        # later run asks again instead of reusing the broken JSON for weeks
+        if choice.finish_reason != "stop":
+            logger.warning("%s response ended with finish_reason '%s', not caching it",
+                           request["model"], choice.finish_reason)
+        elif self.cache is not None:
+            self.cache.set(request, text)
+        return text
+
+    async def research_topic(self, topic, on_partial=None):
+        """Use OpenAI to research the topic
+
+        The response is streamed. If `on_partial` is given, it is called once
+        with the text up to the first paragraph break past
+        PARTIAL_RESEARCH_CHARS, so callers can start work on it early.
+        """
         prompt = f"""
         Research the topic: "{topic}"
         
@@ -91,29 +257,68 @@ class DeepResearch:
             input_data = self._messages_to_responses_input(messages)
             
             # Use the responses API for o4-mini-deep-research model with web search tools
-            response = self.client.responses.create(
-                model="o4-mini-deep-research",
-                input=input_data,
-                tools=[{"type": "web_search_preview"}]
-            )
+            request = {
+                "model": "o4-mini-deep-research",
+                "input": input_data,
+                "tools": [{"type": "web_search_preview"}],
+            }
+            
+            if self.cache is not None:
+                cached = self.cache.get(request)
+                if cached is not None:
+                    print(f"Using cached research for: {topic}")
+                    return cached
+            
+            async def create():
+                await self._throttle(prompt)
+                return await self.client.responses.create(**request, stream=True)
+            
+            stream = await self._with_backoff(request["model"], create)
             
-            # Handle response with proper fallbacks
-            text = getattr(response, "output_text", None)
-            if text is None:
-                # Fallback: attempt to read from first output
-                try:
-                    text = response.output[0].content[0].text
-                except Exception:
-                    text = ""
+            chunks = []
+            received = 0
+            response = None
+            async for event in stream:
+                if event.type == "response.output_text.delta":
+                    chunks.append(event.delta)
+                    received += len(event.delta)
+                    if on_partial is not None and received > PARTIAL_RESEARCH_CHARS and '\n' in event.delta:
+                        text = ''.join(chunks)
+                        cut = partial_research_cut(text)
+                        if cut != -1:
+                            on_partial(text[:cut])
+                            on_partial = None
+                elif event.type == "response.completed":
+                    response = event.response
+                elif event.type == "response.failed":
+                    raise RuntimeError(f"Research failed: {event.response.error}")
+                elif event.type == "error":
+                    raise RuntimeError(f"Research failed: {event.message}")
             
+            text = ''.join(chunks)
+            if not text and response is not None:
+                # Handle response with proper fallbacks
+                text = getattr(response, "output_text", None)
+                if text is None:
+                    # Fallback: attempt to read from first output
+                    try:
+                        text = response.output[0].content[0].text
+                    except Exception:
+                        text = ""
+            
+            if text and self.cache is not None:
+                self.cache.set(request, text)
             return text or ""
+        except RateLimitError:
+            # Still rate limited after backing off, so fail the topic
+            raise
         except Exception as e:
             print(f"Error during research: {e}")
             return None
 
     def create_note(self, topic, research_content, existing_links=None):
         """Create the note file with proper frontmatter"""
-        filename = self.sanitize_filename(topic)
+        filename = sanitize_filename(topic)
         filepath = Path(self.path_to_save) / filename
         
         # Create frontmatter
@@ -142,109 +347,72 @@ note_type: "research"
         full_content = frontmatter + research_content
         
         # Write to file
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(full_content)
-        
-        return filepath
-
-    def find_existing_links(self, new_content):
-        """Find existing files that can be linked to the new content"""
-        existing_files = []
-        for file_path in Path(self.path_to_save).glob("*.md"):
-            if file_path.name != "Simple_Note_Template.md":
-                # Use the filename stem (without .md) as the topic name
-                existing_files.append(file_path.stem)
+        listing_current = self._existing_files_cache is not None and \
+            os.stat(self.path_to_save).st_mtime_ns == self._existing_files_mtime
+        write_atomic(filepath, full_content)
         
-        if not existing_files:
-            return []
+        # Our own write changes the directory mtime. If the cached listing
+        # was up to date, add the new note to it instead of letting the next
+        # lookup rescan the whole vault, so it stays warm across a batch.
+        if listing_current:
+            self._existing_files_cache.add(filename[:-3])
+            self._existing_files_mtime = os.stat(self.path_to_save).st_mtime_ns
         
-        # Use a cheaper model to find relevant links
-        prompt = f"""
-        Given this research content:
-        
-        {new_content[:1000]}...
-        
-        And these existing note titles:
-        {existing_files}
-        
-        Which existing notes (if any) should be linked to this new content?
-        Return only the titles that are directly relevant, separated by commas.
-        If none are relevant, return "none".
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that identifies relevant connections between research notes."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.1
-            )
-            
-            result = response.choices[0].message.content.strip()
-            if result.lower() == "none":
-                return []
-            
-            return [title.strip() for title in result.split(',')]
-        except Exception as e:
-            print(f"Error finding links: {e}")
-            return []
+        return filepath
 
     def extract_wiki_links(self, content):
         """Extract wiki-links from content that don't exist yet"""
         # Extract wiki links using regex - this gets exactly what's inside [[...]]
-        wiki_links = re.findall(r'\[\[([^\]]+)\]\]', content)
-        
-        # Clean up the extracted links (remove any whitespace)
-        wiki_links = [link.strip() for link in wiki_links if link.strip()]
+        # Clean up the extracted links (remove any whitespace) and drop
+        # duplicates, keeping the order they first appear in
+        wiki_links = list(dict.fromkeys(
+            link for link in (m.group(1).strip() for m in _WIKI_LINK_RE.finditer(content)) if link
+        ))
         
         # Get existing files using the same sanitization logic
-        existing_files = set()
-        for f in Path(self.path_to_save).glob("*.md"):
-            if f.name != "Simple_Note_Template.md":
-                # Remove .md extension to get the original topic name
-                existing_files.add(f.stem)
+        existing_files = self._get_existing_files()
         
         # Filter out existing files and return new concepts
         # These will be exact matches to what's inside the wiki links
         new_concepts = [link for link in wiki_links if link not in existing_files]
         
-        print(f"DEBUG: Extracted wiki links: {wiki_links}")
-        print(f"DEBUG: Existing files: {list(existing_files)[:5]}...")
-        print(f"DEBUG: New concepts for queue: {new_concepts}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Extracted wiki links: %s", wiki_links)
+            logger.debug("Existing files: %s...", list(existing_files)[:5])
+            logger.debug("New concepts for queue: %s", new_concepts)
         
         return new_concepts
 
-    def identify_and_link_key_concepts(self, content, topic):
-        """Identify key concepts in the content and convert them to wiki links"""
-        print(f"DEBUG: Starting key concept identification for topic: {topic}")
-        print(f"DEBUG: Content length: {len(content)} characters")
-        
-        # Get existing files to avoid linking to concepts that already exist
-        existing_files = set()
-        for f in Path(self.path_to_save).glob("*.md"):
-            if f.name != "Simple_Note_Template.md":
-                existing_files.add(f.stem)
-        
-        print(f"DEBUG: Found {len(existing_files)} existing files: {list(existing_files)[:5]}...")
+    def build_analysis_request(self, content, topic):
+        """Build the chat completion request that finds key concepts and existing links
+
+        One gpt-4o-mini call answers both questions as a JSON object with
+        "key_concepts" and "existing_links" arrays.
+        """
+        existing_files = sorted(self._get_existing_files())
+        if existing_files:
+            existing_section = f"""
+        Existing note titles:
+        {existing_files}
+        """
+        else:
+            existing_section = """
+        There are no existing notes yet, so "existing_links" must be empty.
+        """
         
-        # Use AI to identify key concepts that should be wiki-linked
         prompt = f"""
-        Analyze this research content and identify key concepts that should be wiki-linked.
+        Analyze this research content.
         
         Research Topic: {topic}
         
         Content:
         {content}
-        
-        Instructions:
+        {existing_section}
+        Task 1 - key_concepts: identify key concepts that should be wiki-linked.
         1. Identify important concepts, terms, people, places, theories, or ideas that could have their own research page
         2. Focus on concepts that are significant enough to warrant their own note
         3. Exclude the main topic itself and very common/generic terms
-        4. Return only the concept names, one per line
-        5. Use the exact spelling/capitalization as they appear in the text
+        4. Use the exact spelling/capitalization as they appear in the text
         
         Example concepts that should be linked:
         - Specific theories (e.g., "Quantum Mechanics", "Evolutionary Theory")
@@ -257,167 +425,279 @@ note_type: "research"
         - Very common words like "research", "study", "analysis"
         - Generic terms like "method", "process", "system"
         
-        IMPORTANT: Return ONLY the concept names, one per line, with no additional text or formatting.
+        Task 2 - existing_links: which existing notes (if any) should be linked to this new content?
+        Return only the existing titles that are directly relevant, spelled exactly as listed.
+        
+        IMPORTANT: Return ONLY a JSON object of the form
+        {{"key_concepts": ["..."], "existing_links": ["..."]}}
         """
         
+        return {
+            "model": "gpt-4o-mini",
+            "messages": [
+                {"role": "system", "content": "You are an expert at identifying key concepts that should be wiki-linked in research notes and relevant connections between research notes. Respond only with JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": 500,
+            "temperature": 0.1,
+            "response_format": {"type": "json_object"},
+        }
+
+    def parse_analysis(self, result):
+        """Parse the JSON analysis response into (key concepts, existing links)
+
+        Existing links the model made up, i.e. titles with no note in the
+        vault, are dropped so they never become dangling wiki links.
+        """
+        logger.debug("AI response: %r", result)
+        
         try:
-            print("DEBUG: Sending request to AI for concept identification...")
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an expert at identifying key concepts that should be wiki-linked in research notes. Return only concept names, one per line."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300,
-                temperature=0.1
-            )
-            
-            concepts_text = response.choices[0].message.content.strip()
-            print(f"DEBUG: AI response: {repr(concepts_text)}")
-            
-            if not concepts_text:
-                print("DEBUG: No concepts identified by AI")
-                return content
-            
-            # Parse the concepts
-            concepts = [concept.strip() for concept in concepts_text.split('\n') if concept.strip()]
-            print(f"DEBUG: Parsed {len(concepts)} concepts: {concepts}")
-            
-            # Filter out concepts that already exist as files
-            new_concepts = [concept for concept in concepts if concept not in existing_files]
-            print(f"DEBUG: After filtering existing files, {len(new_concepts)} new concepts: {new_concepts}")
-            
-            if not new_concepts:
-                print("DEBUG: No new concepts to link")
-                return content
-            
-            # Convert content to wiki links
-            processed_content = content
-            replacements_made = 0
-            
-            for concept in new_concepts:
-                # Use word boundaries to avoid partial matches
-                # Escape special regex characters in the concept
-                escaped_concept = re.escape(concept)
-                pattern = r'\b' + escaped_concept + r'\b'
-                
-                # Count matches before replacement
-                matches = re.findall(pattern, processed_content, flags=re.IGNORECASE)
-                if matches:
-                    print(f"DEBUG: Found {len(matches)} matches for concept '{concept}'")
-                    
-                    # Only replace if it's not already a wiki link
-                    def replace_with_link(match):
-                        matched_text = match.group(0)
-                        # Check if this is already within a wiki link
-                        start_pos = match.start()
-                        # Look backwards to see if we're inside a wiki link
-                        before_text = processed_content[:start_pos]
-                        if before_text.count('[[') > before_text.count(']]'):
-                            # We're inside a wiki link, don't replace
-                            return matched_text
-                        
-                        # Use sanitized concept name to ensure consistency with filenames
-                        sanitized_concept = self.sanitize_filename(concept).replace('.md', '')
-                        return f'[[{sanitized_concept}]]'
-                    
-                    processed_content = re.sub(pattern, replace_with_link, processed_content, flags=re.IGNORECASE)
-                    replacements_made += len(matches)
-                else:
-                    print(f"DEBUG: No matches found for concept '{concept}'")
-            
-            print(f"DEBUG: Made {replacements_made} total replacements")
-            return processed_content
-            
-        except Exception as e:
-            print(f"Error identifying key concepts: {e}")
-            import traceback
-            traceback.print_exc()
-            return content
+            data = json.loads(result) if result else {}
+        except ValueError:
+            logger.warning("Could not parse analysis response: %r", result)
+            return [], []
+        if not isinstance(data, dict):
+            return [], []
+        
+        def strings(key):
+            values = data.get(key)
+            if not isinstance(values, list):
+                return []
+            return [value.strip() for value in values if isinstance(value, str) and value.strip()]
+        
+        existing_files = self._get_existing_files()
+        existing_links = [link for link in strings("existing_links") if link in existing_files]
+        return strings("key_concepts"), existing_links
 
-    def add_to_queue(self, concepts):
-        """Add new concepts to the queue file"""
-        queue_path = Path("queue.txt")
+    async def analyze_content(self, content, topic):
+        """Ask the AI for the key concepts and relevant existing notes in content
+
+        Returns a (key concepts, existing links) pair of lists, empty on
+        error. RateLimitError is raised so the topic can be retried later.
+        """
+        if not should_analyze(content):
+            logger.debug("Skipping analysis of short content (%d characters)", len(content))
+            return [], []
         
-        # Read existing queue
-        existing_queue = []
-        if queue_path.exists():
-            with open(queue_path, 'r') as f:
-                existing_queue = [line.strip() for line in f if line.strip()]
+        # Analyzing the same content again needs no memo here: the request
+        # is identical, so _chat answers it from the response cache
+        request = self.build_analysis_request(content, topic)
         
-        print(f"DEBUG: Existing queue: {existing_queue}")
-        print(f"DEBUG: Adding concepts to queue: {concepts}")
+        try:
+            logger.debug("Sending request to AI for concept and link identification...")
+            return self.parse_analysis(await self._chat(request))
+        except RateLimitError:
+            # Still rate limited after backing off, so fail the topic rather
+            # than saving the note without links
+            raise
+        except Exception:
+            logger.exception("Error identifying key concepts and links")
+            return [], []
+
+    async def identify_and_link_key_concepts(self, content, topic, partial=None):
+        """Identify key concepts and existing links, and convert the concepts to wiki links
+
+        Returns the linked content and the list of relevant existing notes.
+        `partial` is an optional (prefix, task) pair where the task is already
+        analyzing a prefix of the content. Its result is reused, and only the
+        text after the prefix is analyzed, if it is long enough to need it.
+        """
+        logger.debug("Starting key concept identification for topic: %s", topic)
+        logger.debug("Content length: %d characters", len(content))
+        
+        if partial is not None:
+            prefix, prefix_task = partial
+            if content.startswith(prefix):
+                logger.debug("Reusing analysis of the first %d characters", len(prefix))
+                # A short tail is skipped by analyze_content without a call
+                (concepts, existing_links), (tail_concepts, tail_links) = await asyncio.gather(
+                    prefix_task, self.analyze_content(content[len(prefix):], topic)
+                )
+                # Prefix concepts are linked in the tail too, so only add new ones
+                concepts = list(dict.fromkeys(concepts + tail_concepts))
+                existing_links = list(dict.fromkeys(existing_links + tail_links))
+            else:
+                # The prefix did not come from this content, so start over
+                prefix_task.cancel()
+                if prefix_task.done() and not prefix_task.cancelled():
+                    prefix_task.exception()  # Mark any error as retrieved
+                concepts, existing_links = await self.analyze_content(content, topic)
+        else:
+            concepts, existing_links = await self.analyze_content(content, topic)
         
-        # Add new concepts (these should be exact matches to wiki link contents)
-        added_count = 0
-        for concept in concepts:
-            if concept and concept not in existing_queue:
-                existing_queue.append(concept)
-                added_count += 1
-                print(f"DEBUG: Added '{concept}' to queue")
+        try:
+            return self.link_key_concepts(content, concepts), existing_links
+        except Exception:
+            logger.exception("Error linking key concepts")
+            return content, existing_links
+
+    def link_key_concepts(self, content, concepts):
+        """Convert the given key concepts to wiki links in content"""
+        if not concepts:
+            logger.debug("No concepts identified by AI")
+            return content
+        
+        # Get existing files to avoid linking to concepts that already exist
+        existing_files = self._get_existing_files()
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Found %d existing files: %s...", len(existing_files), list(existing_files)[:5])
         
-        # Write back to queue
-        with open(queue_path, 'w') as f:
-            for concept in existing_queue:
-                f.write(f"{concept}\n")
+        logger.debug("Identified %d concepts: %s", len(concepts), concepts)
         
-        print(f"DEBUG: Added {added_count} new concepts to queue")
-        print(f"DEBUG: Total queue size: {len(existing_queue)}")
+        # Filter out concepts that already exist as files
+        new_concepts = [concept for concept in concepts if concept not in existing_files]
+        logger.debug("After filtering existing files, %d new concepts: %s", len(new_concepts), new_concepts)
+        
+        if not new_concepts:
+            logger.debug("No new concepts to link")
+            return content
+        
+        # Map each concept, case-insensitively, to its wiki link target.
+        # Use sanitized concept names to ensure consistency with filenames.
+        # The first spelling returned by the AI wins.
+        link_targets = {}
+        for concept in new_concepts:
+            link_targets.setdefault(concept.lower(), sanitize_filename(concept).replace('.md', ''))
+        
+        # Match every concept in a single pass. Longest concepts come first so
+        # "Quantum Mechanics" is linked as a whole rather than just "Mechanics".
+        # Use word boundaries to avoid partial matches
+        pattern = re.compile(
+            r'\b(' + '|'.join(re.escape(c) for c in sorted(link_targets, key=len, reverse=True)) + r')\b',
+            flags=re.IGNORECASE
+        )
+        
+        # Sorted positions of every wiki link opening and closing bracket pair
+        link_opens = [m.start() for m in re.finditer(r'\[\[', content)]
+        link_closes = [m.start() for m in re.finditer(r'\]\]', content)]
+        match_counts = Counter()
+        
+        def replace_with_link(match):
+            matched_text = match.group(0)
+            # Only replace if it's not already within a wiki link, i.e. more
+            # '[[' than ']]' appear before the match
+            start_pos = match.start()
+            if bisect_left(link_opens, start_pos) > bisect_left(link_closes, start_pos):
+                return matched_text
+            
+            key = matched_text.lower()
+            if key not in link_targets:
+                # Case-insensitive matching can pair characters whose
+                # lowercase forms differ, so fall back to a full comparison
+                key = next(k for k in link_targets if re.fullmatch(re.escape(k), matched_text, flags=re.IGNORECASE))
+            match_counts[key] += 1
+            return f'[[{link_targets[key]}]]'
+        
+        processed_content = pattern.sub(replace_with_link, content)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            for key in link_targets:
+                if match_counts[key]:
+                    logger.debug("Linked %d matches for concept '%s'", match_counts[key], link_targets[key])
+                else:
+                    logger.debug("No matches found for concept '%s'", link_targets[key])
+        
+        logger.debug("Made %d total replacements", sum(match_counts.values()))
+        return processed_content
+
+    def add_to_queue(self, concepts):
+        """Add new concepts to the research queue"""
+        # Add new concepts (these should be exact matches to wiki link contents)
+        logger.debug("Adding concepts to queue: %s", concepts)
+        added_count = research_queue.add_topics(concepts)
+        logger.debug("Added %d new concepts to queue", added_count)
 
     def verify_queue_filename_consistency(self, concepts):
         """Verify that queue entries will match future filenames exactly"""
-        print("DEBUG: Verifying queue-filename consistency...")
+        logger.debug("Verifying queue-filename consistency...")
         for concept in concepts:
             if concept:
                 # This is what the filename will be (without .md extension)
-                future_filename = self.sanitize_filename(concept).replace('.md', '')
-                print(f"DEBUG: Concept '{concept}' -> Future filename '{future_filename}' -> Match: {concept == future_filename}")
+                future_filename = sanitize_filename(concept).replace('.md', '')
+                logger.debug("Concept '%s' -> Future filename '%s' -> Match: %s", concept, future_filename, concept == future_filename)
                 if concept != future_filename:
-                    print(f"WARNING: Concept '{concept}' will not match filename '{future_filename}'")
+                    logger.warning("Concept '%s' will not match filename '%s'", concept, future_filename)
 
-    def run(self, topic):
+    def save_research(self, topic, research_content, existing_links):
+        """Write the note and queue any new concepts it links to"""
+        # Create the note with existing links
+        filepath = self.create_note(topic, research_content, existing_links)
+        print(f"Created note: {filepath}")
+        
+        # Extract new concepts for queue
+        new_concepts = self.extract_wiki_links(research_content)
+        if new_concepts:
+            # Verify that queue entries will match future filenames exactly
+            self.verify_queue_filename_consistency(new_concepts)
+            self.add_to_queue(new_concepts)
+            print(f"Added to queue: {new_concepts}")
+        
+        return filepath
+
+    async def run_async(self, topic):
         """Main research process"""
         print(f"Starting deep research on: {topic}")
         
-        # Step 1: Research the topic
-        research_content = self.research_topic(topic)
+        # Step 1: Research the topic. Once enough of the response has streamed
+        # in, start analyzing it while the rest arrives.
+        partial = None
+        
+        def on_partial(text):
+            nonlocal partial
+            partial = (text, asyncio.create_task(self.analyze_content(text, topic)))
+        
+        research_content = None
+        try:
+            research_content = await self.research_topic(topic, on_partial=on_partial)
+        finally:
+            if not research_content and partial is not None:
+                partial[1].cancel()
         if not research_content:
             print("Failed to research topic")
             return False
         
-        # Step 2: Identify and link key concepts throughout the content
-        print("Identifying key concepts for wiki linking...")
-        research_content = self.identify_and_link_key_concepts(research_content, topic)
-        
-        # Step 3: Find existing links first
-        existing_links = self.find_existing_links(research_content)
+        # Step 2: Link key concepts and find existing links in a single call
+        print("Identifying key concepts and existing links...")
+        research_content, existing_links = await self.identify_and_link_key_concepts(
+            research_content, topic, partial
+        )
         if existing_links:
             print(f"Found relevant existing notes: {existing_links}")
         
-        # Step 4: Create the note with existing links
-        filepath = self.create_note(topic, research_content, existing_links)
-        print(f"Created note: {filepath}")
-        
-        # Step 5: Extract new concepts for queue
-        new_concepts = self.extract_wiki_links(research_content)
-        if new_concepts:
-            # Verify that queue entries will match future filenames exactly
-            self.verify_queue_filename_consistency(new_concepts)
-            self.add_to_queue(new_concepts)
-            print(f"Added to queue: {new_concepts}")
+        # Step 3: Create the note and queue new concepts
+        self.save_research(topic, research_content, existing_links)
         
         print("Research completed successfully!")
         return True
 
+    def run(self, topic):
+        """Synchronous entry point for a single topic
+
+        Closes the HTTP connection pool when done, so use run_async to
+        research several topics with one instance.
+        """
+        async def run_and_close():
+            async with self:
+                return await self.run_async(topic)
+        
+        return asyncio.run(run_and_close())
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python deep_research.py <topic>")
+    configure_logging()
+    
+    args = sys.argv[1:]
+    use_cache = "--no-cache" not in args
+    args = [arg for arg in args if arg != "--no-cache"]
+    
+    if len(args) != 1:
+        print("Usage: python deep_research.py [--no-cache] <topic>")
         sys.exit(1)
     
-    topic = sys.argv[1]
+    topic = args[0]
     
     try:
-        researcher = DeepResearch()
+        researcher = DeepResearch(cache=DiskCache() if use_cache else None)
         researcher.run(topic)
     except Exception as e:
         print(f"Error: {e}")
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+One-shot migration of queue.txt into the SQLite research queue (queue.db)
+"""
+
+import sys
+from pathlib import Path
+import research_queue
+
+def main():
+    queue_path = Path(sys.argv[1] if len(sys.argv) > 1 else research_queue.LEGACY_QUEUE_FILE)
+    if not queue_path.exists():
+        print(f"{queue_path} not found, nothing to migrate")
+        return
+    
+    with open(queue_path, 'r', encoding='utf-8') as f:
+        topics = [line.strip() for line in f if line.strip()]
+    
+    # Topics already in the database are skipped, so re-running is harmless
+    added = research_queue.add_topics(topics)
+    print(f"Imported {added} of {len(topics)} topics from {queue_path} into {research_queue.QUEUE_DB}")
+    
+    # Move the file aside so pop_queue.py stops suggesting the migration
+    backup_path = queue_path.with_name(queue_path.name + ".bak")
+    queue_path.replace(backup_path)
+    print(f"Moved {queue_path} to {backup_path}; delete it once you have checked the queue with 'python pop_queue.py --list'.")
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,33 @@
 #!/usr/bin/env python3
 """
 Queue Processor for Deep Research
-Takes the first concept from queue.txt and processes it with deep_research.py
+Takes concepts from the front of the research queue and researches them concurrently
 """
 
 import os
 import sys
-import re
-import subprocess
+import json
+import asyncio
+import logging
 from pathlib import Path
 from dotenv import load_dotenv
+from openai import RateLimitError
+from cache import DiskCache
+import research_queue
+from common import configure_logging, sanitize_filename
+from deep_research import DeepResearch, RateLimiter, should_analyze
 
 # Load environment variables
 load_dotenv()
 
-def sanitize_filename(topic):
-    """Convert topic to a safe filename that matches wiki links exactly"""
-    # Only remove truly problematic characters for filesystems
-    # Keep spaces, underscores, and most special characters as they appear in wiki links
-    safe_name = re.sub(r'[<>:"/\\|?*]', '', topic)
-    safe_name = safe_name[:100]  # Limit length
-    return safe_name + '.md'
+logger = logging.getLogger(__name__)
+
+# Concurrency and rate limit settings (override in .env)
+MAX_CONCURRENT = int(os.getenv('MAX_CONCURRENT', '5'))
+MAX_ATTEMPTS = int(os.getenv('MAX_ATTEMPTS', '5'))
+MAX_REQUESTS_PER_MINUTE = int(os.getenv('MAX_REQUESTS_PER_MINUTE', '50'))
+MAX_TOKENS_PER_MINUTE = int(os.getenv('MAX_TOKENS_PER_MINUTE', '150000'))
+BATCH_POLL_INTERVAL = int(os.getenv('BATCH_POLL_INTERVAL', '60'))
 
 def topic_exists(topic):
     """Check if a topic already exists in the save directory"""
@@ -34,65 +41,240 @@ def topic_exists(topic):
     
     return filepath.exists()
 
-def read_queue():
-    """Read the queue file and return all items"""
-    queue_path = Path("queue.txt")
-    if not queue_path.exists():
+def finish_claims(rows, results):
+    """Remove researched topics from the queue and release the rest"""
+    research_queue.complete([row for row, success in zip(rows, results) if success])
+    research_queue.release([row for row, success in zip(rows, results) if not success])
+    for row, success in zip(rows, results):
+        if success:
+            print(f"Removed '{row[1]}' from queue")
+
+def print_empty_queue():
+    """Report an empty queue, pointing at queue.txt left over from older versions"""
+    print("Queue is empty!")
+    if Path(research_queue.LEGACY_QUEUE_FILE).exists() and not research_queue.list_topics():
+        print(f"Found {research_queue.LEGACY_QUEUE_FILE} from an older version. "
+              f"Import it with 'python migrate_queue.py'.")
+
+def make_researcher(use_cache=True):
+    """Create a DeepResearch instance with the configured rate limits"""
+    return DeepResearch(
+        rate_limiter=RateLimiter(MAX_REQUESTS_PER_MINUTE, MAX_TOKENS_PER_MINUTE),
+        cache=DiskCache() if use_cache else None,
+        max_attempts=MAX_ATTEMPTS
+    )
+
+async def process_queue(researcher, count):
+    """Research the first `count` items of the queue concurrently
+
+    Returns a list of (topic, success) pairs in queue order.
+    """
+    # Claimed topics are skipped by concurrent workers until they are finished
+    rows = research_queue.claim_topics(count)
+    
+    if not rows:
+        print_empty_queue()
         return []
     
-    with open(queue_path, 'r') as f:
-        return [line.strip() for line in f if line.strip()]
+    topics = [row[1] for row in rows]
+    print(f"Processing {len(topics)} items with up to {MAX_CONCURRENT} at a time")
+    print(f"Remaining in queue: {len(research_queue.list_topics(include_claimed=False))} items")
+    
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+    
+    async def bounded(topic):
+        async with semaphore:
+            # Check if topic already exists
+            if topic_exists(topic):
+                print(f"Topic '{topic}' already exists. Skipping research.")
+                return True
+            
+            print(f"Processing: {topic}")
+            try:
+                return await researcher.run_async(topic)
+            except Exception as e:
+                logger.error("Error during research of '%s': %s", topic, e)
+                return False
+    
+    results = [False] * len(topics)
+    try:
+        results = await asyncio.gather(*[bounded(topic) for topic in topics])
+    finally:
+        # Failed or interrupted topics go back where they were
+        finish_claims(rows, results)
+    
+    return list(zip(topics, results))
+
+async def submit_batch(client, requests):
+    """Upload chat completion requests and start a Batch API job
+
+    `requests` maps a custom_id to the body of a /v1/chat/completions request.
+    """
+    lines = [
+        json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body})
+        for custom_id, body in requests.items()
+    ]
+    batch_file = await client.files.create(
+        file=("batch_requests.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch"
+    )
+    return await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
 
-def write_queue(items):
-    """Write items back to the queue file"""
-    with open("queue.txt", 'w') as f:
-        for item in items:
-            f.write(f"{item}\n")
+async def wait_for_batch(client, batch_id):
+    """Poll a Batch API job until it finishes
 
-def pop_and_research():
-    """Take the first item from queue and research it"""
-    queue_items = read_queue()
+    Returns the response texts by custom_id, and the set of custom_ids whose
+    response did not finish normally (e.g. was cut off by max_tokens).
+    """
+    while True:
+        batch = await client.batches.retrieve(batch_id)
+        if batch.status in ("completed", "failed", "expired", "cancelled"):
+            break
+        counts = batch.request_counts
+        done = f" ({counts.completed}/{counts.total} done)" if counts else ""
+        print(f"Batch {batch_id} is {batch.status}{done}, checking again in {BATCH_POLL_INTERVAL}s")
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
     
-    if not queue_items:
-        print("Queue is empty!")
-        return False
+    if batch.status != "completed":
+        logger.warning("Batch %s ended with status '%s'", batch_id, batch.status)
     
-    # Get the first item
-    topic = queue_items[0]
-    remaining_items = queue_items[1:]
+    if batch.errors and batch.errors.data:
+        for error in batch.errors.data:
+            logger.error("Batch error: %s", error.message)
     
-    print(f"Processing: {topic}")
-    print(f"Remaining in queue: {len(remaining_items)} items")
+    # Expired batches can still have a partial output file. Requests that
+    # failed are listed in the error file instead, or with a non-200 status.
+    results = {}
+    incomplete = set()
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        output = await client.files.content(file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") == 200:
+                choice = response["body"]["choices"][0]
+                results[item["custom_id"]] = (choice["message"]["content"] or "").strip()
+                if choice.get("finish_reason") != "stop":
+                    incomplete.add(item["custom_id"])
+            else:
+                error = item.get("error") or (response.get("body") or {}).get("error") or {}
+                logger.error("Request %s failed: %s", item.get('custom_id'), error.get('message', 'unknown error'))
     
-    # Check if topic already exists
-    if topic_exists(topic):
-        print(f"Topic '{topic}' already exists. Skipping research.")
-        # Remove the processed item from queue
-        write_queue(remaining_items)
-        print(f"Removed '{topic}' from queue")
-        return True
+    return results, incomplete
+
+async def process_queue_batch(researcher):
+    """Research every queue item, sending the gpt-4o-mini call through the Batch API
+
+    Returns a list of (topic, success) pairs in queue order.
+    """
+    rows = research_queue.claim_topics()
+    
+    if not rows:
+        print_empty_queue()
+        return []
     
-    # Run the research
+    topics = [row[1] for row in rows]
+    print(f"Processing all {len(topics)} items in batch mode")
+    
+    results = {}
     try:
-        result = subprocess.run([
-            sys.executable, "deep_research.py", topic
-        ], capture_output=True, text=True, check=True)
-        
-        print("Research completed successfully!")
-        print(result.stdout)
-        
-        # Remove the processed item from queue
-        write_queue(remaining_items)
-        print(f"Removed '{topic}' from queue")
-        
-        return True
+        await research_batch(researcher, topics, results)
+    finally:
+        # Failed or interrupted topics go back where they were
+        finish_claims(rows, [results.get(topic, False) for topic in topics])
+    
+    return [(topic, results.get(topic, False)) for topic in topics]
+
+async def research_batch(researcher, topics, results):
+    """Research topics with the gpt-4o-mini analysis going through one batch
+
+    Records whether each topic succeeded in `results`.
+    """
+    # Step 1: Deep research each topic as usual
+    researched = {}
+    for topic in topics:
+        if topic_exists(topic):
+            print(f"Topic '{topic}' already exists. Skipping research.")
+            results[topic] = True
+            continue
         
-    except subprocess.CalledProcessError as e:
-        print(f"Error during research: {e}")
-        print(f"Error output: {e.stderr}")
-        return False
+        print(f"Researching: {topic}")
+        try:
+            research_content = await researcher.research_topic(topic)
+        except RateLimitError as e:
+            logger.error("Rate limited on '%s', giving up: %s", topic, e)
+            research_content = None
+        if research_content:
+            researched[topic] = research_content
+        else:
+            logger.error("Failed to research '%s'", topic)
+            results[topic] = False
+    
+    # Step 2: Collect the concept and link analysis requests into one batch
+    requests = {}
+    for i, (topic, research_content) in enumerate(researched.items()):
+        if should_analyze(research_content):
+            requests[f"{i}-analysis"] = researcher.build_analysis_request(research_content, topic)
+    
+    # Answer what we can from the cache and only batch the rest
+    responses = {}
+    pending = {}
+    for custom_id, body in requests.items():
+        cached = researcher.cache.get(body) if researcher.cache is not None else None
+        if cached is not None:
+            responses[custom_id] = cached
+        else:
+            pending[custom_id] = body
+    
+    if pending:
+        batch = await submit_batch(researcher.client, pending)
+        print(f"Submitted batch {batch.id} with {len(pending)} requests")
+        batch_responses, incomplete = await wait_for_batch(researcher.client, batch.id)
+        if researcher.cache is not None:
+            # Truncated responses are used once but not cached, as in _chat
+            for custom_id, text in batch_responses.items():
+                if custom_id not in incomplete:
+                    researcher.cache.set(pending[custom_id], text)
+        responses.update(batch_responses)
+    
+    # Step 3: Dispatch the results to the notes and the queue
+    for i, (topic, research_content) in enumerate(researched.items()):
+        try:
+            if f"{i}-analysis" in requests and f"{i}-analysis" not in responses:
+                # Leave it in the queue; its research is cached, so a rerun is cheap
+                logger.warning("No analysis response for '%s', leaving it in the queue", topic)
+                results[topic] = False
+                continue
+            concepts, existing_links = researcher.parse_analysis(responses.get(f"{i}-analysis", ""))
+            research_content = researcher.link_key_concepts(research_content, concepts)
+            researcher.save_research(topic, research_content, existing_links)
+            results[topic] = True
+        except Exception as e:
+            logger.error("Error saving research for '%s': %s", topic, e)
+            results[topic] = False
+
+async def run_queue(researcher, batch_mode, count):
+    """Process the queue, closing the researcher's connections afterwards"""
+    async with researcher:
+        if batch_mode:
+            return await process_queue_batch(researcher)
+        return await process_queue(researcher, count)
 
 def main():
+    configure_logging()
+    
+    use_cache = "--no-cache" not in sys.argv
+    if not use_cache:
+        sys.argv.remove("--no-cache")
+    
     if len(sys.argv) > 1 and sys.argv[1] in ["--help", "-h"]:
         print("Usage: python pop_queue.py [OPTION] [COUNT]")
         print("")
@@ -100,6 +282,8 @@ def main():
         print("  --list, -l          List all items in the queue")
         print("  --clear             Clear the entire queue")
         print("  --check <topic>     Check if a topic already exists")
+        print("  --batch             Process the whole queue, using the Batch API for gpt-4o-mini calls")
+        print("  --no-cache          Ignore cached OpenAI responses (combine with COUNT or --batch)")
         print("  --help, -h          Show this help message")
         print("")
         print("Arguments:")
@@ -109,22 +293,23 @@ def main():
         print("  python pop_queue.py              # Process 1 item")
         print("  python pop_queue.py 3            # Process 3 items")
         print("  python pop_queue.py --list       # List queue contents")
+        print("  python pop_queue.py --batch      # Drain the queue at Batch API prices")
         return
     
     if len(sys.argv) > 1 and sys.argv[1] == "--list":
         # List queue contents
-        queue_items = read_queue()
+        queue_items = research_queue.list_topics()
         if queue_items:
             print("Current queue:")
             for i, item in enumerate(queue_items, 1):
                 print(f"{i}. {item}")
         else:
-            print("Queue is empty!")
+            print_empty_queue()
         return
     
     if len(sys.argv) > 1 and sys.argv[1] == "--clear":
         # Clear the queue
-        write_queue([])
+        research_queue.clear()
         print("Queue cleared!")
         return
     
@@ -138,8 +323,11 @@ def main():
         return
     
     # Determine how many items to process
+    batch_mode = False
     count = 1  # Default to 1
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        batch_mode = True
+    elif len(sys.argv) > 1:
         try:
             count = int(sys.argv[1])
             if count <= 0:
@@ -149,16 +337,27 @@ def main():
             print("Error: Count must be a valid integer")
             sys.exit(1)
     
-    # Process the specified number of items
+    # Process the specified number of items, sharing one researcher (and its
+    # OpenAI client, template and directory cache) across all of them
+    try:
+        # Topics claimed by a run that crashed would otherwise never be picked up
+        released = research_queue.release_stale_claims()
+        if released:
+            print(f"Released {released} topics left claimed by an earlier run")
+        researcher = make_researcher(use_cache)
+        results = asyncio.run(run_queue(researcher, batch_mode, count))
+        if batch_mode:
+            count = len(results)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
     success_count = 0
-    for i in range(count):
-        print(f"\n--- Processing item {i + 1} of {count} ---")
-        success = pop_and_research()
+    for topic, success in results:
         if success:
             success_count += 1
         else:
-            print(f"Failed to process item {i + 1}. Stopping.")
-            break
+            print(f"Failed to process '{topic}'. It remains in the queue.")
     
     print(f"\nCompleted: {success_count} of {count} items processed successfully")
     if success_count < count:
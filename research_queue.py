@@ -0,0 +1,119 @@
+"""
+Research Queue
+Stores topics waiting to be researched in a SQLite database (queue.db)
+"""
+
+import sqlite3
+from contextlib import closing, contextmanager
+
+QUEUE_DB = "queue.db"
+# Plain text queue used by older versions, imported by migrate_queue.py
+LEGACY_QUEUE_FILE = "queue.txt"
+
+# Claims older than this belong to a run that died. It is longer than the
+# 24h Batch API completion window so a live --batch run keeps its topics.
+STALE_CLAIM_HOURS = 25
+
+def connect(path=QUEUE_DB):
+    """Open the queue database, creating the table if needed"""
+    # Autocommit mode, so transactions are only the explicit BEGIN/COMMIT below
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    # WAL lets readers carry on while another process pops or adds topics
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            claimed_at TIMESTAMP
+        )
+    """)
+    # Databases created before claims existed lack the column
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(queue)")]
+    if "claimed_at" not in columns:
+        conn.execute("ALTER TABLE queue ADD COLUMN claimed_at TIMESTAMP")
+    return conn
+
+@contextmanager
+def _transaction(path):
+    """Run a block in a write transaction, taking the lock up front"""
+    with closing(connect(path)) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+def list_topics(include_claimed=True, path=QUEUE_DB):
+    """Return queued topics in queue order
+
+    Topics claimed by a running worker are left out if include_claimed is False.
+    """
+    query = "SELECT topic FROM queue"
+    if not include_claimed:
+        query += " WHERE claimed_at IS NULL"
+    with closing(connect(path)) as conn:
+        return [row[0] for row in conn.execute(query + " ORDER BY id")]
+
+def add_topics(topics, path=QUEUE_DB):
+    """Append topics to the end of the queue, ignoring ones already queued
+
+    Returns the number of topics added.
+    """
+    with _transaction(path) as conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO queue (topic) VALUES (?)",
+            [(topic,) for topic in topics if topic]
+        )
+        return conn.total_changes - before
+
+def claim_topics(count=None, path=QUEUE_DB):
+    """Claim up to `count` unclaimed topics from the front of the queue
+
+    With no count every unclaimed topic is claimed. Claimed topics stay in the
+    queue but are skipped by other workers. Returns (id, topic) rows, which must
+    be handed to complete() or release() once processing ends.
+    """
+    with _transaction(path) as conn:
+        rows = conn.execute(
+            "SELECT id, topic FROM queue WHERE claimed_at IS NULL ORDER BY id LIMIT ?",
+            (-1 if count is None else count,)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE queue SET claimed_at = CURRENT_TIMESTAMP WHERE id = ?",
+            [(row[0],) for row in rows]
+        )
+        return rows
+
+def complete(rows, path=QUEUE_DB):
+    """Remove claimed rows whose topics were researched"""
+    with _transaction(path) as conn:
+        conn.executemany("DELETE FROM queue WHERE id = ?", [(row[0],) for row in rows])
+
+def release(rows, path=QUEUE_DB):
+    """Give claimed rows back to the queue at their original position"""
+    with _transaction(path) as conn:
+        conn.executemany(
+            "UPDATE queue SET claimed_at = NULL WHERE id = ?",
+            [(row[0],) for row in rows]
+        )
+
+def release_stale_claims(max_age_hours=STALE_CLAIM_HOURS, path=QUEUE_DB):
+    """Release claims left behind by runs that crashed
+
+    Returns the number of topics released.
+    """
+    with _transaction(path) as conn:
+        cursor = conn.execute(
+            "UPDATE queue SET claimed_at = NULL WHERE claimed_at < datetime('now', ?)",
+            (f"-{max_age_hours} hours",)
+        )
+        return cursor.rowcount
+
+def clear(path=QUEUE_DB):
+    """Remove every topic from the queue"""
+    with _transaction(path) as conn:
+        conn.execute("DELETE FROM queue")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the Batch API path of the queue processor
+"""
+
+import json
+import shutil
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+import pop_queue
+from deep_research import DeepResearch
+
+RESEARCH = "Entropy measures disorder in a system. " * 20
+
+def ok_line(custom_id, text, finish_reason="stop"):
+    """A successful request in a batch output file"""
+    body = {"choices": [{"message": {"content": text}, "finish_reason": finish_reason}]}
+    return json.dumps({"custom_id": custom_id, "response": {"status_code": 200, "body": body}})
+
+def failed_line(custom_id):
+    """A request the API answered with an error status"""
+    body = {"error": {"message": "bad request"}}
+    return json.dumps({"custom_id": custom_id, "response": {"status_code": 400, "body": body}})
+
+def error_line(custom_id):
+    """A request listed in a batch error file"""
+    return json.dumps({"custom_id": custom_id, "response": None, "error": {"message": "expired"}})
+
+class FakeClient:
+    """Just enough of AsyncOpenAI's files and batches APIs for one batch"""
+
+    def __init__(self, output_lines, error_lines):
+        self.files = SimpleNamespace(create=self._upload, content=self._content)
+        self.batches = SimpleNamespace(create=self._create, retrieve=self._retrieve)
+        self.file_texts = {"output": "\n".join(output_lines), "errors": "\n".join(error_lines)}
+        self.submitted = []
+
+    async def _upload(self, file, purpose):
+        self.submitted = [json.loads(line)["custom_id"] for line in file[1].decode("utf-8").splitlines()]
+        return SimpleNamespace(id="input")
+
+    async def _content(self, file_id):
+        return SimpleNamespace(text=self.file_texts[file_id])
+
+    async def _create(self, **kwargs):
+        return SimpleNamespace(id="batch")
+
+    async def _retrieve(self, batch_id):
+        return SimpleNamespace(
+            status="completed", request_counts=None, errors=None,
+            output_file_id="output", error_file_id="errors"
+        )
+
+@pytest.fixture
+def researcher(tmp_path, monkeypatch):
+    """A DeepResearch working in a temporary directory with an empty vault"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("PATH_TO_SAVE", str(tmp_path / "vault"))
+    # Run where queue.db is disposable, with the note template alongside
+    shutil.copy(Path(__file__).parent / "Simple_Note_Template.md", tmp_path)
+    monkeypatch.chdir(tmp_path)
+    researcher = DeepResearch()
+    yield researcher
+    asyncio.run(researcher.aclose())
+
+def test_wait_for_batch_reads_output_and_error_files():
+    """Only 200 responses are returned; failures from both files are dropped"""
+    client = FakeClient(
+        [ok_line("0-analysis", " {} "), failed_line("1-analysis"), ok_line("3-analysis", '{"key', "length")],
+        [error_line("2-analysis")]
+    )
+    responses, incomplete = asyncio.run(pop_queue.wait_for_batch(client, "batch"))
+    assert responses == {"0-analysis": "{}", "3-analysis": '{"key'}
+    assert incomplete == {"3-analysis"}
+
+def test_missing_analysis_leaves_topic_queued(researcher):
+    """Topics whose analysis failed or is missing are not counted as done"""
+    analysis = json.dumps({"key_concepts": ["Disorder"], "existing_links": []})
+    researcher.client = FakeClient(
+        [ok_line("0-analysis", analysis), failed_line("1-analysis")],
+        [error_line("2-analysis")]
+    )
+    
+    async def research_topic(topic):
+        return RESEARCH
+    researcher.research_topic = research_topic
+    
+    topics = ["Alpha", "Beta", "Gamma", "Delta"]
+    results = {}
+    asyncio.run(pop_queue.research_batch(researcher, topics, results))
+    
+    # Delta's request is in the batch but in neither file
+    assert researcher.client.submitted == ["0-analysis", "1-analysis", "2-analysis", "3-analysis"]
+    assert results == {"Alpha": True, "Beta": False, "Gamma": False, "Delta": False}
+    notes = sorted(path.name for path in Path(researcher.path_to_save).iterdir())
+    assert notes == ["Alpha.md"]
+    assert "[[Disorder]]" in (Path(researcher.path_to_save) / "Alpha.md").read_text(encoding='utf-8')
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk OpenAI response cache
+"""
+
+import os
+import time
+from cache import DiskCache
+
+REQUEST = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.1}
+
+def test_round_trip(tmp_path):
+    """A stored response is returned for the same request only"""
+    cache = DiskCache(tmp_path / "llm")
+    assert cache.get(REQUEST) is None
+    
+    cache.set(REQUEST, "hello")
+    assert cache.get(REQUEST) == "hello"
+    assert cache.get({**REQUEST, "temperature": 0.2}) is None
+
+def test_expired_entries_are_misses(tmp_path):
+    """Entries older than the TTL are ignored"""
+    cache = DiskCache(tmp_path, ttl=60)
+    cache.set(REQUEST, "hello")
+    
+    path = cache._path(REQUEST)
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert cache.get(REQUEST) is None
+
+def test_corrupt_entries_are_misses(tmp_path):
+    """A truncated or malformed cache file is treated as a miss"""
+    cache = DiskCache(tmp_path)
+    cache.set(REQUEST, "hello")
+    
+    cache._path(REQUEST).write_text('{"text": "hel', encoding='utf-8')
+    assert cache.get(REQUEST) is None
+    
+    cache._path(REQUEST).write_text('{"other": 1}', encoding='utf-8')
+    assert cache.get(REQUEST) is None
+    
+    cache._path(REQUEST).write_text('[1]', encoding='utf-8')
+    assert cache.get(REQUEST) is None
+
+def test_unwritable_cache_does_not_raise(tmp_path):
+    """Failing to store a response is not an error"""
+    blocker = tmp_path / "blocker"
+    blocker.write_text("not a directory", encoding='utf-8')
+    
+    cache = DiskCache(blocker / "llm")
+    cache.set(REQUEST, "hello")
+    assert cache.get(REQUEST) is None
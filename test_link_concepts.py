@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for turning key concepts into wiki links
+"""
+
+import json
+import asyncio
+from pathlib import Path
+import pytest
+from deep_research import DeepResearch, PARTIAL_RESEARCH_CHARS, partial_research_cut
+
+@pytest.fixture
+def researcher(tmp_path, monkeypatch):
+    """A DeepResearch saving notes to an empty temporary vault"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("PATH_TO_SAVE", str(tmp_path / "vault"))
+    # The note template is loaded from the working directory
+    monkeypatch.chdir(Path(__file__).parent)
+    researcher = DeepResearch()
+    yield researcher
+    asyncio.run(researcher.aclose())
+
+def add_notes(researcher, *titles):
+    """Create empty notes in the vault"""
+    for title in titles:
+        (Path(researcher.path_to_save) / f"{title}.md").write_text("", encoding='utf-8')
+
+def test_longest_concept_wins(researcher):
+    """Overlapping concepts are linked as the longest match"""
+    content = "Quantum Mechanics differs from classical mechanics."
+    linked = researcher.link_key_concepts(content, ["Mechanics", "Quantum Mechanics"])
+    assert linked == "[[Quantum Mechanics]] differs from classical [[Mechanics]]."
+
+def test_matching_ignores_case(researcher):
+    """Every spelling is linked to the concept as the AI wrote it"""
+    linked = researcher.link_key_concepts("ENTROPY and entropy", ["Entropy"])
+    assert linked == "[[Entropy]] and [[Entropy]]"
+
+def test_whole_words_only(researcher):
+    """Concepts inside longer words are left alone"""
+    assert researcher.link_key_concepts("Photons and photonics", ["Photon"]) == "Photons and photonics"
+
+def test_existing_links_are_untouched(researcher):
+    """Text already inside a wiki link is not linked again"""
+    content = "See [[Heat Engine]] and the engine."
+    linked = researcher.link_key_concepts(content, ["Engine"])
+    assert linked == "See [[Heat Engine]] and the [[Engine]]."
+
+def test_existing_notes_are_not_linked(researcher):
+    """Concepts that already have a note are left as plain text"""
+    add_notes(researcher, "Entropy")
+    linked = researcher.link_key_concepts("Entropy and enthalpy", ["Entropy", "Enthalpy"])
+    assert linked == "Entropy and [[Enthalpy]]"
+
+def test_parse_analysis(researcher):
+    """Valid JSON is split into stripped concept and link lists"""
+    add_notes(researcher, "Heat Engine")
+    result = '{"key_concepts": [" Entropy ", "", 3], "existing_links": ["Heat Engine"]}'
+    assert researcher.parse_analysis(result) == (["Entropy"], ["Heat Engine"])
+
+def test_parse_analysis_drops_unknown_links(researcher):
+    """Existing links without a note in the vault are dropped"""
+    add_notes(researcher, "Heat Engine")
+    result = '{"key_concepts": [], "existing_links": ["Made Up Note", "Heat Engine"]}'
+    assert researcher.parse_analysis(result) == ([], ["Heat Engine"])
+
+@pytest.mark.parametrize("result", ["", "not json", "[1, 2]", '{"key_concepts": "Entropy"}'])
+def test_parse_analysis_malformed(researcher, result):
+    """Malformed responses give no concepts or links"""
+    assert researcher.parse_analysis(result) == ([], [])
+
+def test_partial_research_cut():
+    """Early analysis stops at the first paragraph break past the threshold"""
+    head = "x" * PARTIAL_RESEARCH_CHARS
+    assert partial_research_cut("a\n\n" + head + "\n\nrest") == PARTIAL_RESEARCH_CHARS + 3
+    assert partial_research_cut("a\n\n" + head) == -1
+
+def analyze_with_prefix(researcher, prefix, content):
+    """Run identify_and_link_key_concepts with an early analysis of prefix
+
+    Each analysis call answers with one concept and one existing link named
+    after the call number. Returns the result and the content of each call.
+    """
+    analyzed = []
+    
+    async def chat(request):
+        analyzed.append(request["messages"][-1]["content"])
+        n = len(analyzed)
+        return json.dumps({"key_concepts": [f"Concept{n}"], "existing_links": [f"Note{n}"]})
+    researcher._chat = chat
+    add_notes(researcher, "Note1", "Note2")
+    
+    async def run():
+        partial = (prefix, asyncio.create_task(researcher.analyze_content(prefix, "Topic")))
+        return await researcher.identify_and_link_key_concepts(content, "Topic", partial)
+    
+    return asyncio.run(run()), analyzed
+
+PREFIX = "Concept1 and Concept2. " * 20
+
+def test_short_tail_reuses_early_analysis(researcher):
+    """A short tail adds no analysis call"""
+    content = PREFIX + "\n\nConcept1 again."
+    (linked, links), analyzed = analyze_with_prefix(researcher, PREFIX, content)
+    assert len(analyzed) == 1
+    assert linked.endswith("[[Concept1]] again.")
+    assert links == ["Note1"]
+
+def test_long_tail_is_analyzed_alone(researcher):
+    """Only the text after the prefix is sent, and both results are merged"""
+    tail = "\n\n" + "More about Concept2. " * 20
+    (linked, links), analyzed = analyze_with_prefix(researcher, PREFIX, PREFIX + tail)
+    assert len(analyzed) == 2
+    assert tail.strip() in analyzed[1] and PREFIX not in analyzed[1]
+    assert "[[Concept1]]" in linked and "[[Concept2]]" in linked
+    assert links == ["Note1", "Note2"]
+
+def test_unrelated_prefix_is_discarded(researcher):
+    """Content that does not start with the prefix is analyzed in full"""
+    content = "Different text about Concept2. " * 20
+    (linked, links), analyzed = analyze_with_prefix(researcher, PREFIX, content)
+    assert content in analyzed[-1]
+    assert links == [f"Note{len(analyzed)}"]
@@ -3,28 +3,19 @@
 Test script to verify queue-filename consistency
 """
 
-import re
 from pathlib import Path
-
-def sanitize_filename(topic):
-    """Convert topic to a safe filename that matches wiki links exactly"""
-    # Only remove truly problematic characters for filesystems
-    # Keep spaces, underscores, and most special characters as they appear in wiki links
-    safe_name = re.sub(r'[<>:"/\\|?*]', '', topic)
-    safe_name = safe_name[:100]  # Limit length
-    return safe_name + '.md'
+import research_queue
+from common import sanitize_filename
 
 def test_queue_consistency():
     """Test that queue entries match future filenames exactly"""
     
-    # Read the queue file
-    queue_path = Path("queue.txt")
-    if not queue_path.exists():
-        print("Queue file not found")
+    # Read the queue database
+    if not Path(research_queue.QUEUE_DB).exists():
+        print("Queue database not found")
         return
     
-    with open(queue_path, 'r') as f:
-        lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    lines = research_queue.list_topics()
     
     print(f"Testing {len(lines)} queue entries...")
     print()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite research queue
+"""
+
+import sqlite3
+import pytest
+import research_queue
+
+@pytest.fixture
+def db(tmp_path):
+    """Path to a queue database holding three topics"""
+    path = str(tmp_path / "queue.db")
+    research_queue.add_topics(["Alpha", "Beta", "Gamma"], path=path)
+    return path
+
+def test_add_ignores_duplicates(db):
+    """Topics already queued are not added twice"""
+    assert research_queue.add_topics(["Beta", "Delta", "", "Delta"], path=db) == 1
+    assert research_queue.list_topics(path=db) == ["Alpha", "Beta", "Gamma", "Delta"]
+
+def test_claims_are_exclusive(db):
+    """Claimed topics stay queued but are not handed out again"""
+    assert [row[1] for row in research_queue.claim_topics(2, path=db)] == ["Alpha", "Beta"]
+    assert [row[1] for row in research_queue.claim_topics(path=db)] == ["Gamma"]
+    assert research_queue.claim_topics(path=db) == []
+    assert research_queue.list_topics(path=db) == ["Alpha", "Beta", "Gamma"]
+    assert research_queue.list_topics(include_claimed=False, path=db) == []
+
+def test_claimed_topics_are_not_requeued(db):
+    """A topic being researched cannot be added again"""
+    research_queue.claim_topics(1, path=db)
+    assert research_queue.add_topics(["Alpha"], path=db) == 0
+
+def test_complete_and_release(db):
+    """Completed topics leave the queue, released ones keep their place"""
+    alpha, beta = research_queue.claim_topics(2, path=db)
+    research_queue.complete([alpha], path=db)
+    research_queue.release([beta], path=db)
+    research_queue.add_topics(["Delta"], path=db)
+    assert research_queue.list_topics(path=db) == ["Beta", "Gamma", "Delta"]
+    assert [row[1] for row in research_queue.claim_topics(1, path=db)] == ["Beta"]
+
+def test_release_stale_claims(db):
+    """Only claims older than the limit are released"""
+    research_queue.claim_topics(2, path=db)
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE queue SET claimed_at = datetime('now', '-2 days') WHERE topic = 'Alpha'")
+    assert research_queue.release_stale_claims(path=db) == 1
+    assert research_queue.list_topics(include_claimed=False, path=db) == ["Alpha", "Gamma"]
+
+def test_old_databases_gain_claims(tmp_path):
+    """A queue created before claims existed is upgraded in place"""
+    path = str(tmp_path / "queue.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+            CREATE TABLE queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT UNIQUE NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("INSERT INTO queue (topic) VALUES ('Alpha')")
+    assert [row[1] for row in research_queue.claim_topics(path=path)] == ["Alpha"]
+
+def test_clear(db):
+    """Clearing empties the queue"""
+    research_queue.clear(path=db)
+    assert research_queue.list_topics(path=db) == []
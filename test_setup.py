@@ -81,15 +81,16 @@ def test_setup():
         return False
     
     # Test 5: Queue file
-    print("\n5. Testing queue file...")
+    print("\n5. Testing queue database...")
     
-    queue_path = Path("queue.txt")
+    import research_queue
+    queue_path = Path(research_queue.QUEUE_DB)
     if not queue_path.exists():
-        print("   ⚠️  queue.txt not found, creating...")
-        queue_path.touch()
-        print("   ✅ queue.txt created")
+        print("   ⚠️  queue.db not found, creating...")
+        research_queue.connect().close()
+        print("   ✅ queue.db created")
     else:
-        print("   ✅ queue.txt found")
+        print("   ✅ queue.db found")
     
     print("\n" + "=" * 40)
     print("✅ Setup test completed successfully!")